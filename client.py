@@ -15,27 +15,65 @@
     
     # Указать другой сервер
     python client.py document.pdf --url http://server:8000
+    
+    # Ждать ответа дольше (очередь на сервере), 0 - без ограничения
+    python client.py document.pdf --timeout 1800
 """
 
 import argparse
-import json
+import mimetypes
 import sys
 from pathlib import Path
 from typing import Optional
 
 try:
+    import orjson
     import requests
+    from requests.adapters import HTTPAdapter
+    from requests_toolbelt import MultipartEncoder
+    from urllib3.util.retry import Retry
 except ImportError:
-    print("❌ Требуется библиотека requests")
-    print("Установите: pip install requests")
+    print("❌ Требуются библиотеки requests, requests-toolbelt и orjson")
+    print("Установите: pip install requests requests-toolbelt orjson")
     sys.exit(1)
 
 
+# Таймауты (connect, read): чтение с запасом относительно OCR_TIMEOUT сервера
+# по умолчанию (600s); ожидание в очереди на сервере сюда не входит - см. --timeout
+CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 600 + 30
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+
+
 class ChandraOCRClient:
     """Клиент для Chandra OCR API"""
     
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        timeout: tuple = DEFAULT_TIMEOUT
+    ):
         self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        
+        # Общая сессия: keep-alive соединения переиспользуются между запросами.
+        # Повторы по 502/503/504 urllib3 делает только для идемпотентных
+        # методов, то есть для GET /health; POST с файлом не повторяется
+        retry = Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+    
+    def close(self):
+        """Закрыть HTTP-сессию"""
+        self._session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
     
     def ocr(
         self,
@@ -56,20 +94,10 @@ class ChandraOCRClient:
         Returns:
             Распознанный текст
         """
-        url = f"{self.base_url}/ocr"
-        
-        with open(file_path, 'rb') as f:
-            files = {'file': f}
-            data = {
-                'method': method,
-                'include_images': include_images,
-                'include_headers': include_headers
-            }
-            
-            response = requests.post(url, files=files, data=data)
-            response.raise_for_status()
-            
-            return response.text
+        response = self._post_file(
+            "/ocr", file_path, method, include_images, include_headers
+        )
+        return response.text
     
     def ocr_json(
         self,
@@ -90,25 +118,50 @@ class ChandraOCRClient:
         Returns:
             Словарь с результатами
         """
-        url = f"{self.base_url}/ocr/json"
+        response = self._post_file(
+            "/ocr/json", file_path, method, include_images, include_headers
+        )
+        return response.json()
+    
+    def _post_file(
+        self,
+        path: str,
+        file_path: str,
+        method: str,
+        include_images: bool,
+        include_headers: bool
+    ) -> requests.Response:
+        """
+        Отправить файл потоковым multipart-запросом
+        
+        MultipartEncoder читает файл с диска частями по мере отправки,
+        поэтому тело запроса целиком в памяти не собирается.
+        """
+        file_path = Path(file_path)
+        mime = mimetypes.guess_type(file_path.name)[0] or 'application/octet-stream'
         
         with open(file_path, 'rb') as f:
-            files = {'file': f}
-            data = {
+            encoder = MultipartEncoder(fields={
+                'file': (file_path.name, f, mime),
                 'method': method,
-                'include_images': include_images,
-                'include_headers': include_headers
-            }
+                'include_images': str(include_images).lower(),
+                'include_headers': str(include_headers).lower()
+            })
             
-            response = requests.post(url, files=files, data=data)
+            response = self._session.post(
+                f"{self.base_url}{path}",
+                data=encoder,
+                headers={'Content-Type': encoder.content_type},
+                timeout=self.timeout
+            )
             response.raise_for_status()
             
-            return response.json()
+            return response
     
     def health(self) -> dict:
         """Проверить здоровье сервиса"""
         url = f"{self.base_url}/health"
-        response = requests.get(url)
+        response = self._session.get(url, timeout=self.timeout)
         response.raise_for_status()
         return response.json()
 
@@ -123,6 +176,7 @@ def main():
   %(prog)s scan.jpg --output result.txt
   %(prog)s form.pdf --json --pretty
   %(prog)s invoice.pdf --url http://192.168.1.100:8000
+  %(prog)s book.pdf --timeout 1800
   %(prog)s --health
         """
     )
@@ -175,6 +229,14 @@ def main():
         help='Сохранить результат в файл'
     )
     
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=DEFAULT_READ_TIMEOUT,
+        help=f'Время ожидания ответа в секундах, 0 - без ограничения '
+             f'(default: {DEFAULT_READ_TIMEOUT})'
+    )
+    
     parser.add_argument(
         '--health',
         action='store_true',
@@ -184,13 +246,16 @@ def main():
     args = parser.parse_args()
     
     # Создание клиента
-    client = ChandraOCRClient(base_url=args.url)
+    client = ChandraOCRClient(
+        base_url=args.url,
+        timeout=(CONNECT_TIMEOUT, args.timeout or None)
+    )
     
     # Проверка здоровья
     if args.health:
         try:
             health = client.health()
-            print(json.dumps(health, indent=2, ensure_ascii=False))
+            print(orjson.dumps(health, option=orjson.OPT_INDENT_2).decode())
             
             if health.get('status') == 'healthy':
                 print("\n✓ Сервис работает нормально")
@@ -231,10 +296,9 @@ def main():
             )
             
             # Форматирование вывода
-            if args.pretty:
-                output = json.dumps(result, indent=2, ensure_ascii=False)
-            else:
-                output = json.dumps(result, ensure_ascii=False)
+            output = orjson.dumps(
+                result, option=orjson.OPT_INDENT_2 if args.pretty else 0
+            ).decode()
             
             # Вывод метрик
             print(f"\n✓ Готово!")
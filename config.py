@@ -4,6 +4,7 @@
 
 import os
 from pathlib import Path
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
@@ -14,11 +15,14 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     LOG_LEVEL: str = "INFO"
+    WEB_CONCURRENCY: int = 1  # Процессов uvicorn (каждый загружает свою модель)
     
     # Директории
     BASE_DIR: Path = Path("/data/chandraocr")
-    TEMP_DIR: Path = BASE_DIR / "temp"
+    TEMP_DIR: Path = Path("/dev/shm/chandraocr")  # tmpfs (в памяти)
+    TEMP_FALLBACK_DIR: Path = BASE_DIR / "temp"  # на диске, если в tmpfs мало места
     LOG_DIR: Path = BASE_DIR / "logs"
+    CACHE_DIR: Path = BASE_DIR / "cache"
     
     # Файлы
     LOG_FILE: Path = LOG_DIR / "chandra_ocr.log"
@@ -26,10 +30,24 @@ class Settings(BaseSettings):
     # Ограничения
     MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100 МБ
     OCR_TIMEOUT: int = 600  # 10 минут
+    TEMP_MAX_AGE: int = 3600  # секунд, старше - удаляются уборщиком (не меньше 2 x OCR_TIMEOUT)
+    TEMP_SWEEP_INTERVAL: int = 600  # секунд
+    HEALTH_CHECK_INTERVAL: int = 60  # секунд, период проверки chandra для /health
+    OCR_CONCURRENCY: Optional[int] = None  # Параллельных страниц (vLLM), None - по умолчанию Chandra
+    
+    # Кэш результатов OCR (по хэшу содержимого файла)
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 1000
+    CACHE_SWEEP_INTERVAL: int = 600  # секунд
+    
+    # Ответы по заголовку X-Idempotency-Key (в памяти)
+    IDEMPOTENCY_CACHE_SIZE: int = 1024
+    IDEMPOTENCY_TTL: int = 3600  # секунд
     
     # Настройки Chandra
     DEFAULT_METHOD: str = "hf"  # hf или vllm
     MODEL_CHECKPOINT: str = "datalab-to/chandra"
+    CHANDRA_IN_PROCESS: bool = True  # Модель в процессе сервиса (False = CLI на каждый запрос)
     MAX_OUTPUT_TOKENS: int = 8192
     
     # vLLM настройки (если используется)
@@ -4,39 +4,104 @@ Chandra OCR API Service
 """
 
 import os
+import re
+import queue
+import atexit
+import asyncio
+import contextlib
+import hashlib
 import shutil
 import subprocess
 import tempfile
 import logging
+import logging.handlers
+import importlib.metadata
+import time
+import uuid
 from pathlib import Path
-from typing import Optional
 from datetime import datetime
+from typing import Any, BinaryIO, Callable, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
-from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Header, Request, Response
+from fastapi.responses import FileResponse, PlainTextResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+import orjson
+from cachetools import TTLCache
 
 from config import settings
 
-# Настройка логирования
+# Настройка логирования: запись в файл и консоль выполняет фоновый поток
+# QueueListener, вызовы logger в обработчиках запросов только ставят запись в очередь
+settings.LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [
+    logging.FileHandler(settings.LOG_FILE),
+    logging.StreamHandler()
+]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+
+log_queue = queue.Queue(-1)
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
+log_listener = logging.handlers.QueueListener(log_queue, *log_handlers)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(settings.LOG_FILE),
-        logging.StreamHandler()
-    ]
+    level=settings.LOG_LEVEL.upper(),
+    handlers=[queue_handler]
 )
 logger = logging.getLogger(__name__)
 
+# Размер блока при сохранении загружаемого файла
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 МБ
+
+# Идентификатор изображения в хранилище: sha256 + расширение
+IMAGE_ID_RE = re.compile(r"[0-9a-f]{64}\.(?:png|webp|jpe?g)")
+
+
+def model_tag() -> str:
+    """
+    Идентификатор модели, которой получены результаты OCR
+    
+    Входит в ключ кэша: после смены чекпойнта, лимита токенов
+    или версии chandra старые результаты не используются.
+    """
+    try:
+        version = importlib.metadata.version("chandra-ocr")
+    except importlib.metadata.PackageNotFoundError:
+        version = ""
+    
+    identity = "|".join((
+        settings.MODEL_CHECKPOINT,
+        settings.VLLM_MODEL_NAME,
+        str(settings.MAX_OUTPUT_TOKENS),
+        version
+    ))
+    return hashlib.blake2b(identity.encode(), digest_size=4).hexdigest()
+
+
+MODEL_TAG = model_tag()
+
+# Один поток для OCR: модель не рассчитана на параллельные вызовы
+ocr_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chandra")
+
+# Запуски CLI Chandra по одному (каждый процесс загружает модель)
+cli_semaphore = asyncio.Semaphore(1)
+
 # Инициализация FastAPI
 app = FastAPI(
     title="Chandra OCR API",
     description="Локальный сервис OCR на базе модели Chandra для распознавания документов",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware для доступа из браузера
@@ -53,9 +118,15 @@ class OCRProcessor:
     """Класс для обработки OCR запросов"""
     
     # Поддерживаемые форматы
-    SUPPORTED_EXTENSIONS = {
+    SUPPORTED_EXTENSIONS = frozenset({
         '.pdf', '.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'
-    }
+    })
+    
+    # Расширение по суффиксу имени файла (в нижнем регистре, без точки)
+    EXT_BY_SUFFIX = {ext[1:]: ext for ext in SUPPORTED_EXTENSIONS}
+    
+    # Изображения, извлекаемые Chandra из документа
+    IMAGE_OUTPUT_SUFFIXES = ('.png', '.webp', '.jpg', '.jpeg')
     
     CONTENT_TYPE_MAP = {
         'application/pdf': '.pdf',
@@ -79,33 +150,431 @@ class OCRProcessor:
         content_type = (upload.content_type or "").lower()
         
         # Проверка по Content-Type
-        if content_type in OCRProcessor.CONTENT_TYPE_MAP:
-            return OCRProcessor.CONTENT_TYPE_MAP[content_type]
+        ext = OCRProcessor.CONTENT_TYPE_MAP.get(content_type)
+        if ext is not None:
+            return ext
         
         # Проверка по имени файла
-        if upload.filename and "." in upload.filename:
-            ext = "." + upload.filename.rsplit(".", 1)[-1].lower()
-            if ext in OCRProcessor.SUPPORTED_EXTENSIONS:
-                return ext
+        if upload.filename:
+            _, dot, suffix = upload.filename.rpartition(".")
+            if dot:
+                ext = OCRProcessor.EXT_BY_SUFFIX.get(suffix.lower())
+                if ext is not None:
+                    return ext
         
         # Fallback
-        logger.warning(f"Unknown file type: {content_type}, filename: {upload.filename}")
+        logger.warning("Unknown file type: %s, filename: %s", content_type, upload.filename)
         return ".bin"
     
     @staticmethod
     def validate_extension(ext: str) -> bool:
-        """Проверка поддерживаемого расширения"""
-        return ext.lower() in OCRProcessor.SUPPORTED_EXTENSIONS
+        """Проверка поддерживаемого расширения (ext в нижнем регистре)"""
+        return ext in OCRProcessor.SUPPORTED_EXTENSIONS
+    
+    @staticmethod
+    def save_upload(src: BinaryIO, dst_path: Path) -> Tuple[int, str]:
+        """
+        Сохранение загруженного файла с одновременным подсчетом хэша
+        
+        Блоки читаются в один переиспользуемый буфер (без создания
+        bytes на каждый блок). Вызывается в отдельном потоке.
+        
+        Returns:
+            (размер в байтах, hex-дайджест BLAKE2b содержимого)
+        """
+        file_hash = hashlib.blake2b(digest_size=16)
+        buffer = bytearray(UPLOAD_CHUNK_SIZE)
+        view = memoryview(buffer)
+        file_size = 0
+        
+        # SpooledTemporaryFile до Python 3.11 не поддерживает readinto
+        readinto = getattr(src, "readinto", None)
+        
+        src.seek(0)
+        with dst_path.open("wb") as f:
+            while True:
+                if readinto is not None:
+                    chunk = view[:readinto(buffer) or 0]
+                else:
+                    chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                file_hash.update(chunk)
+                file_size += len(chunk)
+        
+        return file_size, file_hash.hexdigest()
+    
+    @staticmethod
+    def cache_key(
+        digest: str,
+        method: str,
+        include_images: bool,
+        include_headers: bool
+    ) -> str:
+        """Ключ кэша: хэш содержимого файла + параметры обработки + модель"""
+        return f"{digest}_{method}_{int(include_images)}_{int(include_headers)}_{MODEL_TAG}"
+    
+    @staticmethod
+    def cache_get(key: str) -> Optional[dict]:
+        """
+        Получение результата OCR из кэша (None при промахе)
+        
+        processing_time в результате - время чтения из кэша,
+        а не время исходного распознавания.
+        """
+        if not settings.CACHE_ENABLED:
+            return None
+        
+        start_time = time.perf_counter()
+        entry = settings.CACHE_DIR / f"{key}.json"
+        try:
+            result = orjson.loads(entry.read_bytes())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Не удалось прочитать кэш %s: %s", entry.name, e)
+            return None
+        
+        # Обновление времени доступа для LRU-вытеснения
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        
+        result['processing_time'] = time.perf_counter() - start_time
+        return result
+    
+    @staticmethod
+    def cache_put(key: str, result: dict) -> None:
+        """Сохранение результата OCR в кэш"""
+        if not settings.CACHE_ENABLED:
+            return
+        
+        try:
+            settings.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            
+            # Запись через временный файл, чтобы не оставить битую запись
+            entry = settings.CACHE_DIR / f"{key}.json"
+            tmp_entry = settings.CACHE_DIR / f"{key}.{uuid.uuid4().hex}.tmp"
+            try:
+                tmp_entry.write_bytes(orjson.dumps(result))
+                os.replace(tmp_entry, entry)
+            except BaseException:
+                tmp_entry.unlink(missing_ok=True)
+                raise
+        except Exception as e:
+            logger.warning("Не удалось сохранить результат в кэш: %s", e)
+    
+    @staticmethod
+    def sweep_cache() -> int:
+        """
+        Вытеснение давно неиспользуемых записей кэша
+        
+        Изображения удаляются, если на них не ссылается ни одна
+        оставшаяся запись.
+        
+        Returns:
+            Количество удаленных записей
+        """
+        if not settings.CACHE_DIR.exists():
+            return 0
+        
+        entries = []
+        for entry in settings.CACHE_DIR.glob("*.json"):
+            try:
+                entries.append((entry.stat().st_mtime, entry))
+            except FileNotFoundError:
+                continue
+        
+        entries.sort()
+        excess = max(0, len(entries) - settings.CACHE_MAX_ENTRIES)
+        for _, entry in entries[:excess]:
+            entry.unlink(missing_ok=True)
+        
+        # Изображения, на которые ссылаются оставшиеся записи
+        referenced = set()
+        for _, entry in entries[excess:]:
+            try:
+                result = orjson.loads(entry.read_bytes())
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning("Не удалось прочитать кэш %s: %s", entry.name, e)
+                continue
+            referenced.update(image['id'] for image in result.get('images', []))
+        
+        # Свежие изображения не трогаются - их запись в кэш может еще не быть сохранена
+        deadline = time.time() - settings.TEMP_MAX_AGE
+        for image in (settings.CACHE_DIR / "by-hash").glob("*/*"):
+            if image.name in referenced:
+                continue
+            try:
+                if image.stat().st_mtime < deadline:
+                    image.unlink()
+            except FileNotFoundError:
+                continue
+        
+        return excess
+    
+    @staticmethod
+    def image_path(image_id: str) -> Path:
+        """Путь к изображению в хранилище по его идентификатору (sha256 + расширение)"""
+        return settings.CACHE_DIR / "by-hash" / image_id[:2] / image_id
+    
+    @staticmethod
+    def store_images(image_files: list) -> list:
+        """
+        Сохранение извлеченных изображений в хранилище по хэшу содержимого
+        
+        Одинаковые изображения хранятся один раз; файл переносится жесткой
+        ссылкой, а копируется только если хранилище на другой файловой системе.
+        
+        Returns:
+            Список {'name', 'id', 'url'} для ответа API
+        """
+        if not settings.CACHE_ENABLED:
+            return []
+        
+        images = []
+        for img_path in image_files:
+            name = os.path.basename(img_path)
+            digest = hashlib.sha256(Path(img_path).read_bytes()).hexdigest()
+            image_id = digest + os.path.splitext(name)[1].lower()
+            target = OCRProcessor.image_path(image_id)
+            
+            try:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(img_path, target)
+                except FileExistsError:
+                    pass
+                except OSError:
+                    # Другая файловая система (например, TEMP_DIR в tmpfs)
+                    tmp_target = target.with_name(f"{image_id}.{uuid.uuid4().hex}.tmp")
+                    shutil.copyfile(img_path, tmp_target)
+                    os.replace(tmp_target, target)
+                os.utime(target)
+            except OSError as e:
+                logger.warning("Не удалось сохранить изображение %s: %s", name, e)
+                continue
+            
+            images.append({'name': name, 'id': image_id, 'url': f"/images/{image_id}"})
+        
+        return images
+    
+    # Модели Chandra, загруженные в процесс сервиса (по методу инференса)
+    _models: dict = {}
+    
+    @staticmethod
+    def get_model(method: str):
+        """
+        Получение модели Chandra, загруженной в процесс сервиса
+        
+        Модель загружается один раз и переиспользуется всеми запросами,
+        без повторной загрузки весов на каждый документ.
+        
+        Returns:
+            InferenceManager или None, если нужно использовать CLI
+        """
+        if not settings.CHANDRA_IN_PROCESS:
+            return None
+        
+        if method not in OCRProcessor._models:
+            try:
+                from chandra.model import InferenceManager
+            except ImportError as e:
+                logger.warning("Python API Chandra недоступен, используется CLI: %s", e)
+                OCRProcessor._models[method] = None
+            else:
+                logger.info("Загрузка модели Chandra (method=%s)", method)
+                try:
+                    OCRProcessor._models[method] = InferenceManager(method=method)
+                except Exception as e:
+                    raise RuntimeError(f"Не удалось загрузить модель Chandra: {e}") from e
+        
+        return OCRProcessor._models[method]
+    
+    @staticmethod
+    def _run_model(
+        method: str,
+        input_path: Path,
+        output_dir: Path,
+        include_images: bool,
+        include_headers: bool
+    ) -> bool:
+        """
+        Распознавание загруженной моделью (выходные файлы как у CLI)
+        
+        Returns:
+            False, если модель в процессе недоступна и нужен CLI
+        """
+        # Отсчет возраста директории для уборщика - с начала OCR, а не с
+        # ожидания в очереди (директории других воркеров он не отличает)
+        OCRProcessor._touch(input_path.parent)
+        
+        model = OCRProcessor.get_model(method)
+        if model is None:
+            return False
+        
+        from chandra.input import load_file
+        from chandra.model.schema import BatchInputItem
+        from chandra.scripts.cli import save_merged_output
+        
+        logger.info("Запуск Chandra (in-process, method=%s): %s", model.method, input_path.name)
+        
+        try:
+            images = load_file(str(input_path), {})
+            
+            generate_kwargs = {
+                'include_images': include_images,
+                'include_headers_footers': include_headers
+            }
+            
+            if model.method == "hf":
+                # Локальная модель: страницы по одной, как в CLI Chandra
+                batch_size = 1
+            else:
+                # vLLM: все страницы документа отправляются на сервер
+                # параллельно; без OCR_CONCURRENCY число запросов выбирает Chandra
+                batch_size = len(images) or 1
+                if settings.OCR_CONCURRENCY:
+                    generate_kwargs['max_workers'] = settings.OCR_CONCURRENCY
+            
+            results = []
+            for start in range(0, len(images), batch_size):
+                batch = [
+                    BatchInputItem(image=image, prompt_type="ocr_layout")
+                    for image in images[start:start + batch_size]
+                ]
+                results.extend(model.generate(batch, **generate_kwargs))
+            
+            save_merged_output(
+                output_dir, input_path.name, results, save_images=include_images
+            )
+        except Exception as e:
+            logger.error("Chandra OCR failed: %s", e, exc_info=True)
+            raise RuntimeError(f"Ошибка OCR: {e}")
+        
+        return True
     
     @staticmethod
-    def run_chandra_ocr(
+    async def _run_cli(
+        input_path: Path,
+        output_dir: Path,
+        method: str,
+        include_images: bool,
+        include_headers: bool
+    ) -> None:
+        """Распознавание через CLI Chandra (отдельный процесс)"""
+        # Формирование команды
+        cmd = [
+            "chandra",
+            str(input_path),
+            str(output_dir),
+            "--method", method,
+        ]
+        
+        # Дополнительные параметры
+        if not include_images:
+            cmd.append("--no-images")
+        if not include_headers:
+            cmd.append("--no-headers-footers")
+        
+        logger.info("Запуск Chandra: %s", " ".join(cmd))
+        
+        # Вывод прогресса не нужен и отбрасывается; stderr пишется в файл,
+        # а не в PIPE (не копится в памяти) - из него берется текст ошибки
+        stderr_path = input_path.parent / "stderr.log"
+        
+        # Запуск процесса (по одному: каждый процесс загружает свою модель)
+        async with cli_semaphore:
+            OCRProcessor._touch(input_path.parent)
+            with stderr_path.open("wb") as stderr:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=stderr
+                )
+                try:
+                    await asyncio.wait_for(proc.wait(), timeout=settings.OCR_TIMEOUT)
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    logger.error("Timeout при обработке файла %s", input_path.name)
+                    raise RuntimeError(f"Превышено время ожидания ({settings.OCR_TIMEOUT}s)")
+        
+        if proc.returncode != 0:
+            error_msg = OCRProcessor._read_tail(stderr_path, 2000) or "Unknown error"
+            logger.error("Chandra OCR failed: %s", error_msg)
+            raise RuntimeError(f"Ошибка OCR (код {proc.returncode}): {error_msg}")
+    
+    @staticmethod
+    def _touch(path: Path) -> None:
+        """Обновление времени изменения (ошибки игнорируются)"""
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+    
+    @staticmethod
+    def scan_output(output_dir: Path) -> tuple:
+        """
+        Поиск выходных файлов Chandra за один обход директории
+        
+        Returns:
+            (md, html, metadata, images) - списки путей к файлам
+        """
+        md_files, html_files, metadata_files, image_files = [], [], [], []
+        stack = [str(output_dir)]
+        
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+            
+            with entries:
+                for entry in entries:
+                    name = entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif name.endswith(".md"):
+                        md_files.append(entry.path)
+                    elif name.endswith(".html"):
+                        html_files.append(entry.path)
+                    elif name.endswith("_metadata.json"):
+                        metadata_files.append(entry.path)
+                    elif name.endswith(OCRProcessor.IMAGE_OUTPUT_SUFFIXES):
+                        image_files.append(entry.path)
+        
+        return md_files, html_files, metadata_files, image_files
+    
+    @staticmethod
+    def _read_tail(path: Path, size: int) -> str:
+        """Чтение последних size байт файла"""
+        with path.open("rb") as f:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - size))
+            return f.read().decode("utf-8", errors="replace")
+    
+    @staticmethod
+    def _read_metadata(path: str) -> dict:
+        """Чтение метаданных Chandra (пустой dict при ошибке)"""
+        try:
+            return orjson.loads(Path(path).read_bytes())
+        except Exception as e:
+            logger.warning("Не удалось прочитать метаданные: %s", e)
+            return {}
+    
+    @staticmethod
+    async def run_chandra_ocr(
         input_path: Path, 
         method: str = "hf",
         include_images: bool = False,
         include_headers: bool = False
     ) -> dict:
         """
-        Запуск Chandra OCR через CLI
+        Запуск Chandra OCR (загруженной моделью или через CLI)
         
         Args:
             input_path: Путь к входному файлу
@@ -123,44 +592,34 @@ class OCRProcessor:
         output_dir = input_path.parent / "output"
         output_dir.mkdir(exist_ok=True)
         
-        # Формирование команды
-        cmd = [
-            "chandra",
-            str(input_path),
-            str(output_dir),
-            "--method", method,
-        ]
+        start_time = time.perf_counter()
         
-        # Дополнительные параметры
-        if not include_images:
-            cmd.append("--no-images")
-        if not include_headers:
-            cmd.append("--no-headers-footers")
-        
-        logger.info(f"Запуск Chandra: {' '.join(cmd)}")
-        
-        # Запуск процесса
-        start_time = datetime.now()
-        try:
-            proc = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                timeout=settings.OCR_TIMEOUT
+        # Модель вызывается в отдельном потоке, не блокируя event loop;
+        # таймаут включает ожидание в очереди executor и загрузку модели
+        in_process = False
+        if settings.CHANDRA_IN_PROCESS:
+            future = ocr_executor.submit(
+                OCRProcessor._run_model,
+                method, input_path, output_dir, include_images, include_headers
             )
-        except subprocess.TimeoutExpired:
-            logger.error(f"Timeout при обработке файла {input_path.name}")
-            raise RuntimeError(f"Превышено время ожидания ({settings.OCR_TIMEOUT}s)")
+            try:
+                in_process = await asyncio.wait_for(
+                    asyncio.wrap_future(future), timeout=settings.OCR_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                # Вызов из очереди отменяется, а начатый прервать нельзя:
+                # директория запроса удаляется, когда он завершится
+                release_temp_dir_when_done(input_path.parent, future)
+                raise RuntimeError(f"Превышено время ожидания ({settings.OCR_TIMEOUT}s)")
         
-        processing_time = (datetime.now() - start_time).total_seconds()
+        if not in_process:
+            await OCRProcessor._run_cli(
+                input_path, output_dir, method, include_images, include_headers
+            )
         
-        if proc.returncode != 0:
-            error_msg = proc.stderr[-2000:] if proc.stderr else "Unknown error"
-            logger.error(f"Chandra OCR failed: {error_msg}")
-            raise RuntimeError(f"Ошибка OCR (код {proc.returncode}): {error_msg}")
+        processing_time = time.perf_counter() - start_time
         
-        logger.info(f"OCR выполнен за {processing_time:.2f}s")
+        logger.info("OCR выполнен за %.2fs", processing_time)
         
         # Поиск результатов
         result = {
@@ -168,34 +627,51 @@ class OCRProcessor:
             'html': '',
             'metadata': {},
             'images_count': 0,
+            'images': [],
             'processing_time': processing_time
         }
         
-        # Поиск markdown файла
-        md_files = list(output_dir.glob("**/*.md"))
+        md_files, html_files, metadata_files, image_files = await asyncio.to_thread(
+            OCRProcessor.scan_output, output_dir
+        )
+        
+        # Чтение markdown, HTML и метаданных параллельно
+        reads = []
         if md_files:
-            result['text'] = md_files[0].read_text(encoding="utf-8", errors="ignore")
-            logger.info(f"Найден markdown: {md_files[0].name}, размер: {len(result['text'])} символов")
+            reads.append(asyncio.to_thread(
+                Path(md_files[0]).read_text, encoding="utf-8", errors="ignore"
+            ))
+        if html_files:
+            reads.append(asyncio.to_thread(
+                Path(html_files[0]).read_text, encoding="utf-8", errors="ignore"
+            ))
+        if metadata_files:
+            reads.append(asyncio.to_thread(OCRProcessor._read_metadata, metadata_files[0]))
         
-        # Поиск HTML файла
-        html_files = list(output_dir.glob("**/*.html"))
+        contents = iter(await asyncio.gather(*reads))
+        
+        # Markdown файл
+        if md_files:
+            result['text'] = next(contents)
+            logger.info(
+                "Найден markdown: %s, размер: %d символов",
+                os.path.basename(md_files[0]), len(result['text'])
+            )
+        
+        # HTML файл
         if html_files:
-            result['html'] = html_files[0].read_text(encoding="utf-8", errors="ignore")
+            result['html'] = next(contents)
         
-        # Поиск метаданных
-        metadata_files = list(output_dir.glob("**/*_metadata.json"))
+        # Метаданные
         if metadata_files:
-            import json
-            try:
-                result['metadata'] = json.loads(
-                    metadata_files[0].read_text(encoding="utf-8")
-                )
-            except Exception as e:
-                logger.warning(f"Не удалось прочитать метаданные: {e}")
+            result['metadata'] = next(contents)
         
-        # Подсчет изображений
-        image_files = list(output_dir.glob("**/images/*.png"))
+        # Изображения
         result['images_count'] = len(image_files)
+        if image_files:
+            result['images'] = await asyncio.to_thread(
+                OCRProcessor.store_images, image_files
+            )
         
         if not result['text'] and not result['html']:
             logger.error("Не найден выходной файл (.md/.html)")
@@ -206,6 +682,365 @@ class OCRProcessor:
 
 processor = OCRProcessor()
 
+# Ответы по ключу идемпотентности (X-Idempotency-Key) для повторных запросов:
+# ключ -> (ключ кэша результата запроса, ответ)
+idempotency_cache = TTLCache(
+    maxsize=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl=settings.IDEMPOTENCY_TTL
+)
+
+
+def idempotency_lookup(idempotency_key: Optional[str], cache_key: str):
+    """
+    Ответ, сохраненный по ключу идемпотентности
+    
+    Ключ кэша результата включает хэш файла и параметры распознавания,
+    поэтому повтор ключа с другим запросом отклоняется, а не получает
+    чужой ответ.
+    
+    Returns:
+        Сохраненный ответ или None
+    """
+    if not idempotency_key:
+        return None
+    
+    entry = idempotency_cache.get(idempotency_key)
+    if entry is None:
+        return None
+    
+    stored_cache_key, stored_response = entry
+    if stored_cache_key != cache_key:
+        raise HTTPException(
+            status_code=422,
+            detail="Ключ идемпотентности уже использован для другого запроса"
+        )
+    return stored_response
+
+
+# Временные директории запросов, которые еще обрабатываются
+active_temp_dirs: set = set()
+
+# Директории запросов, в которые еще пишет брошенный по таймауту вызов модели
+detached_temp_dirs: set = set()
+
+
+def temp_root() -> Path:
+    """
+    Директория для временных файлов запроса
+    
+    По умолчанию TEMP_DIR в tmpfs; если там не хватает места
+    под файл и результаты OCR - TEMP_FALLBACK_DIR на диске.
+    """
+    try:
+        if shutil.disk_usage(settings.TEMP_DIR).free > settings.MAX_FILE_SIZE * 4:
+            return settings.TEMP_DIR
+    except OSError:
+        pass
+    
+    settings.TEMP_FALLBACK_DIR.mkdir(parents=True, exist_ok=True)
+    return settings.TEMP_FALLBACK_DIR
+
+
+@contextlib.contextmanager
+def request_temp_dir(request_id: str):
+    """Временная директория запроса, удаляется по завершении обработки"""
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f"chandra_{request_id}_", dir=temp_root()))
+    active_temp_dirs.add(tmp_dir)
+    try:
+        yield tmp_dir
+    finally:
+        if tmp_dir not in detached_temp_dirs:
+            release_temp_dir(tmp_dir)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[%s] Временная директория очищена", request_id)
+
+
+def release_temp_dir(tmp_dir: Path) -> None:
+    """Удаление временной директории запроса"""
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    active_temp_dirs.discard(tmp_dir)
+
+
+def release_temp_dir_when_done(tmp_dir: Path, future: Future) -> None:
+    """
+    Удаление директории запроса после завершения вызова модели
+    
+    Поток, брошенный по таймауту, продолжает писать результаты в
+    директорию; удаленная раньше, она была бы создана им заново.
+    """
+    detached_temp_dirs.add(tmp_dir)
+    
+    def release(_: Future) -> None:
+        detached_temp_dirs.discard(tmp_dir)
+        release_temp_dir(tmp_dir)
+    
+    future.add_done_callback(release)
+
+
+def sweep_temp_dirs() -> int:
+    """
+    Удаление временных директорий, оставшихся от прерванных запросов
+    
+    Директории запросов этого процесса, которые еще обрабатываются,
+    не удаляются независимо от их возраста. Запросы других воркеров
+    (WEB_CONCURRENCY > 1) отсюда не видны: их директории защищает
+    возраст - он отсчитывается с начала OCR, который длится не дольше
+    OCR_TIMEOUT, поэтому срок не бывает меньше удвоенного OCR_TIMEOUT.
+    
+    Returns:
+        Количество удаленных директорий
+    """
+    deadline = time.time() - max(settings.TEMP_MAX_AGE, 2 * settings.OCR_TIMEOUT)
+    removed = 0
+    
+    for root in (settings.TEMP_DIR, settings.TEMP_FALLBACK_DIR):
+        for tmp_dir in root.glob("chandra_*"):
+            if tmp_dir in active_temp_dirs:
+                continue
+            try:
+                if tmp_dir.stat().st_mtime < deadline:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    
+    return removed
+
+
+async def temp_janitor():
+    """Периодическая очистка временных директорий"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_temp_dirs)
+            if removed:
+                logger.info("Удалено %d устаревших временных директорий", removed)
+        except Exception as e:
+            logger.warning("Ошибка очистки временных файлов: %s", e)
+        await asyncio.sleep(settings.TEMP_SWEEP_INTERVAL)
+
+
+def check_chandra() -> bool:
+    """Проверка доступности команды chandra"""
+    try:
+        result = subprocess.run(
+            ["chandra", "--help"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=5
+        )
+        return result.returncode == 0
+    except Exception as e:
+        logger.error("Chandra недоступна: %s", e)
+        return False
+
+
+async def update_chandra_status():
+    """Обновление состояния chandra, которое отдает /health"""
+    app.state.chandra_available = await asyncio.to_thread(check_chandra)
+    app.state.chandra_checked_at = datetime.now().isoformat(timespec="seconds")
+
+
+async def chandra_monitor():
+    """Периодическая проверка доступности chandra для /health"""
+    while True:
+        await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+        await update_chandra_status()
+
+
+async def cache_sweeper():
+    """Периодическая очистка кэша результатов OCR"""
+    while True:
+        await asyncio.sleep(settings.CACHE_SWEEP_INTERVAL)
+        try:
+            removed = await asyncio.to_thread(processor.sweep_cache)
+            if removed:
+                logger.info("Кэш: удалено %d устаревших записей", removed)
+        except Exception as e:
+            logger.warning("Ошибка очистки кэша: %s", e)
+
+
+@app.on_event("startup")
+async def startup():
+    """Инициализация при запуске сервиса"""
+    try:
+        settings.TEMP_DIR.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logger.warning("TEMP_DIR недоступна (%s), используется %s", e, settings.TEMP_FALLBACK_DIR)
+    settings.TEMP_FALLBACK_DIR.mkdir(parents=True, exist_ok=True)
+    app.state.temp_janitor = asyncio.create_task(temp_janitor())
+    
+    # Проверка chandra при запуске и далее по таймеру, а не на каждый /health
+    await update_chandra_status()
+    app.state.chandra_monitor = asyncio.create_task(chandra_monitor())
+    
+    if settings.CACHE_ENABLED:
+        settings.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        app.state.cache_sweeper = asyncio.create_task(cache_sweeper())
+    
+    # Загрузка модели заранее, чтобы первый запрос не ждал ее
+    if settings.CHANDRA_IN_PROCESS:
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                ocr_executor, processor.get_model, settings.DEFAULT_METHOD
+            )
+        except Exception as e:
+            logger.error("Не удалось загрузить модель Chandra: %s", e, exc_info=True)
+
+
+async def receive_upload(file: UploadFile, tmp_dir: Path) -> Tuple[Path, int, str]:
+    """
+    Сохранение загруженного multipart-файла во временную директорию
+    
+    Returns:
+        (путь к файлу, размер в байтах, дайджест содержимого)
+    """
+    ext = processor.detect_extension(file)
+    if not processor.validate_extension(ext):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неподдерживаемый формат файла: {ext}. "
+                   f"Поддерживаются: {', '.join(sorted(processor.SUPPORTED_EXTENSIONS))}"
+        )
+    
+    input_path = tmp_dir / f"input{ext}"
+    file_size, file_digest = await asyncio.to_thread(
+        processor.save_upload, file.file, input_path
+    )
+    
+    if file_size == 0:
+        raise HTTPException(status_code=400, detail="Файл пустой")
+    
+    if file_size > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Файл слишком большой: {file_size} байт. "
+                   f"Максимум: {settings.MAX_FILE_SIZE} байт"
+        )
+    
+    return input_path, file_size, file_digest
+
+
+async def receive_body(request: Request, input_path: Path) -> str:
+    """
+    Сохранение тела запроса по мере поступления
+    
+    Запись и хэширование идут в потоке, блоками по UPLOAD_CHUNK_SIZE,
+    чтобы дисковый ввод-вывод не блокировал event loop.
+    
+    Returns:
+        Дайджест содержимого
+    """
+    file_size = 0
+    file_hash = hashlib.blake2b(digest_size=16)
+    
+    def write_block(f: BinaryIO, data: bytearray) -> None:
+        f.write(data)
+        file_hash.update(data)
+    
+    f = await asyncio.to_thread(input_path.open, "wb")
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            file_size += len(chunk)
+            if file_size > settings.MAX_FILE_SIZE:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Файл слишком большой. Максимум: {settings.MAX_FILE_SIZE} байт"
+                )
+            buffer += chunk
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                data, buffer = buffer, bytearray()
+                await asyncio.to_thread(write_block, f, data)
+        if buffer:
+            await asyncio.to_thread(write_block, f, buffer)
+    finally:
+        await asyncio.to_thread(f.close)
+    
+    if file_size == 0:
+        raise HTTPException(status_code=400, detail="Файл пустой")
+    
+    return file_hash.hexdigest()
+
+
+async def process_document(
+    request_id: str,
+    response: Response,
+    input_path: Path,
+    digest: str,
+    method: Optional[str],
+    include_images: bool,
+    include_headers: bool,
+    idempotency_key: Optional[str],
+    render: Callable[[dict], Any]
+):
+    """
+    Общая часть endpoint'ов OCR: ответ по ключу идемпотентности,
+    результат из кэша или запуск Chandra, заголовок X-Cache
+    
+    Args:
+        request_id: Идентификатор запроса для логов
+        response: Ответ endpoint'а (для заголовка X-Cache)
+        input_path: Сохраненный входной файл
+        digest: Дайджест содержимого файла
+        method: Метод инференса (hf или vllm, по умолчанию hf)
+        include_images: Извлекать изображения
+        include_headers: Включать колонтитулы
+        idempotency_key: Ключ идемпотентности с префиксом endpoint'а
+        render: Построение тела ответа из результата OCR
+        
+    Returns:
+        Тело ответа
+    """
+    # Метод входит в ключ кэша (имя файла) - проверяется до его построения
+    method = method or "hf"
+    if method not in ("hf", "vllm"):
+        raise HTTPException(status_code=400, detail="method должен быть 'hf' или 'vllm'")
+    
+    cache_key = processor.cache_key(digest, method, include_images, include_headers)
+    
+    # Повтор запроса с тем же ключом - ответ без распознавания
+    cached_response = idempotency_lookup(idempotency_key, cache_key)
+    if cached_response is not None:
+        logger.info("[%s] Ответ по ключу идемпотентности", request_id)
+        response.headers["X-Cache"] = "HIT"
+        return cached_response
+    
+    try:
+        result = await asyncio.to_thread(processor.cache_get, cache_key)
+        if result is not None:
+            logger.info("[%s] Результат взят из кэша", request_id)
+            response.headers["X-Cache"] = "HIT"
+        else:
+            result = await processor.run_chandra_ocr(
+                input_path,
+                method=method,
+                include_images=include_images,
+                include_headers=include_headers
+            )
+            await asyncio.to_thread(processor.cache_put, cache_key, result)
+            response.headers["X-Cache"] = "MISS"
+            
+            logger.info(
+                "[%s] OCR завершен: %d символов, %d изображений, %.2fs",
+                request_id,
+                len(result['text']),
+                result['images_count'],
+                result['processing_time']
+            )
+    except ValueError as e:
+        logger.error("[%s] Ошибка валидации: %s", request_id, e)
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        logger.error("[%s] Ошибка обработки: %s", request_id, e)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    content = render(result)
+    if idempotency_key:
+        idempotency_cache[idempotency_key] = (cache_key, content)
+    
+    return content
+
 
 @app.post(
     "/ocr",
@@ -222,176 +1057,164 @@ processor = OCRProcessor()
     }
 )
 async def ocr_endpoint(
+    response: Response,
     file: UploadFile = File(..., description="Файл документа (PDF, JPG, PNG)"),
     method: Optional[str] = Form(default="hf", description="Метод: hf или vllm"),
     include_images: bool = Form(default=False, description="Извлекать изображения"),
-    include_headers: bool = Form(default=False, description="Включать колонтитулы")
+    include_headers: bool = Form(default=False, description="Включать колонтитулы"),
+    x_idempotency_key: Optional[str] = Header(
+        default=None, description="Ключ идемпотентности для повторных запросов"
+    )
 ):
     """
     Основной endpoint для OCR
     """
-    request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    logger.info(f"[{request_id}] Новый запрос OCR: {file.filename}, method={method}")
-    
-    # Создание временной директории
-    tmp_dir = Path(tempfile.mkdtemp(prefix=f"chandra_{request_id}_", dir=settings.TEMP_DIR))
+    request_id = uuid.uuid4().hex[:12]
+    logger.info("[%s] Новый запрос OCR: %s, method=%s", request_id, file.filename, method)
     
-    try:
-        # Определение расширения
-        ext = processor.detect_extension(file)
-        
-        # Проверка поддерживаемого формата
-        if not processor.validate_extension(ext):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Неподдерживаемый формат файла: {ext}. "
-                       f"Поддерживаются: {', '.join(processor.SUPPORTED_EXTENSIONS)}"
-            )
+    with request_temp_dir(request_id) as tmp_dir:
+        input_path, file_size, file_digest = await receive_upload(file, tmp_dir)
+        logger.info("[%s] Файл сохранен: %s, размер: %d байт", request_id, input_path.name, file_size)
         
-        # Сохранение файла
+        return await process_document(
+            request_id, response, input_path, file_digest,
+            method, include_images, include_headers,
+            idempotency_key=x_idempotency_key and f"/ocr:{x_idempotency_key}",
+            render=lambda result: result['text']
+        )
+
+
+@app.post(
+    "/ocr/raw",
+    response_class=PlainTextResponse,
+    summary="Распознать документ (тело запроса - файл)",
+    description=(
+        "То же что /ocr, но файл передается телом запроса без multipart. "
+        "Формат определяется по Content-Type (application/pdf, image/png и т.д.) "
+        "или параметром ext, остальные параметры - в query string."
+    )
+)
+async def ocr_raw_endpoint(
+    request: Request,
+    response: Response,
+    method: str = "hf",
+    include_images: bool = False,
+    include_headers: bool = False,
+    ext: Optional[str] = None,
+    x_idempotency_key: Optional[str] = Header(default=None)
+):
+    """
+    OCR endpoint с файлом в теле запроса
+    """
+    request_id = uuid.uuid4().hex[:12]
+    content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    logger.info("[%s] RAW OCR запрос: %s, method=%s", request_id, content_type, method)
+    
+    if ext:
+        ext = ext.lower() if ext.startswith(".") else "." + ext.lower()
+    else:
+        ext = processor.CONTENT_TYPE_MAP.get(content_type, ".bin")
+    
+    if not processor.validate_extension(ext):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неподдерживаемый формат: {ext}"
+        )
+    
+    with request_temp_dir(request_id) as tmp_dir:
         input_path = tmp_dir / f"input{ext}"
-        file_size = 0
-        
-        with input_path.open("wb") as f:
-            while True:
-                chunk = await file.read(8192)
-                if not chunk:
-                    break
-                f.write(chunk)
-                file_size += len(chunk)
+        file_digest = await receive_body(request, input_path)
         
-        logger.info(f"[{request_id}] Файл сохранен: {input_path.name}, размер: {file_size} байт")
-        
-        # Проверка на пустой файл
-        if file_size == 0:
-            raise HTTPException(status_code=400, detail="Файл пустой")
-        
-        # Проверка максимального размера
-        if file_size > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Файл слишком большой: {file_size} байт. "
-                       f"Максимум: {settings.MAX_FILE_SIZE} байт"
-            )
-        
-        # Запуск OCR
-        try:
-            result = processor.run_chandra_ocr(
-                input_path,
-                method=method or "hf",
-                include_images=include_images,
-                include_headers=include_headers
-            )
-            
-            logger.info(
-                f"[{request_id}] OCR завершен: "
-                f"{len(result['text'])} символов, "
-                f"{result['images_count']} изображений, "
-                f"{result['processing_time']:.2f}s"
-            )
-            
-            # Возврат текста
-            return result['text']
-            
-        except ValueError as e:
-            logger.error(f"[{request_id}] Ошибка валидации: {e}")
-            raise HTTPException(status_code=400, detail=str(e))
-        except RuntimeError as e:
-            logger.error(f"[{request_id}] Ошибка обработки: {e}")
-            raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        # Очистка временных файлов
-        try:
-            shutil.rmtree(tmp_dir, ignore_errors=True)
-            logger.debug(f"[{request_id}] Временная директория очищена")
-        except Exception as e:
-            logger.warning(f"[{request_id}] Ошибка при очистке: {e}")
+        return await process_document(
+            request_id, response, input_path, file_digest,
+            method, include_images, include_headers,
+            idempotency_key=x_idempotency_key and f"/ocr/raw:{x_idempotency_key}",
+            render=lambda result: result['text']
+        )
 
 
 @app.post(
     "/ocr/json",
-    response_class=JSONResponse,
+    response_class=ORJSONResponse,
     summary="Распознать документ (JSON ответ)",
     description="То же что /ocr, но возвращает JSON с дополнительной информацией"
 )
 async def ocr_json_endpoint(
+    response: Response,
     file: UploadFile = File(...),
     method: Optional[str] = Form(default="hf"),
     include_images: bool = Form(default=False),
-    include_headers: bool = Form(default=False)
+    include_headers: bool = Form(default=False),
+    x_idempotency_key: Optional[str] = Header(default=None)
 ):
     """
     OCR endpoint с JSON-ответом (включает метаданные)
     """
-    request_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    logger.info(f"[{request_id}] JSON OCR запрос: {file.filename}")
-    
-    tmp_dir = Path(tempfile.mkdtemp(prefix=f"chandra_{request_id}_", dir=settings.TEMP_DIR))
+    request_id = uuid.uuid4().hex[:12]
+    logger.info("[%s] JSON OCR запрос: %s", request_id, file.filename)
     
-    try:
-        ext = processor.detect_extension(file)
-        
-        if not processor.validate_extension(ext):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Неподдерживаемый формат: {ext}"
-            )
-        
-        input_path = tmp_dir / f"input{ext}"
-        file_size = 0
-        
-        with input_path.open("wb") as f:
-            while True:
-                chunk = await file.read(8192)
-                if not chunk:
-                    break
-                f.write(chunk)
-                file_size += len(chunk)
-        
-        if file_size == 0:
-            raise HTTPException(status_code=400, detail="Файл пустой")
-        
-        if file_size > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Файл слишком большой: {file_size} байт"
-            )
-        
-        result = processor.run_chandra_ocr(
-            input_path,
-            method=method or "hf",
-            include_images=include_images,
-            include_headers=include_headers
-        )
-        
-        logger.info(f"[{request_id}] JSON OCR завершен успешно")
-        
+    def render(result: dict) -> dict:
         return {
             "success": True,
             "text": result['text'],
             "html": result['html'] if result['html'] else None,
             "metadata": result['metadata'],
             "images_count": result['images_count'],
+            "images": result.get('images', []),
             "processing_time": result['processing_time'],
             "file_size": file_size,
             "filename": file.filename
         }
     
+    try:
+        with request_temp_dir(request_id) as tmp_dir:
+            input_path, file_size, file_digest = await receive_upload(file, tmp_dir)
+            
+            payload = await process_document(
+                request_id, response, input_path, file_digest,
+                method, include_images, include_headers,
+                idempotency_key=x_idempotency_key and f"/ocr/json:{x_idempotency_key}",
+                render=render
+            )
+        
+        logger.info("[%s] JSON OCR завершен успешно", request_id)
+        return payload
+    
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"[{request_id}] Ошибка: {e}", exc_info=True)
+        logger.error("[%s] Ошибка: %s", request_id, e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get(
+    "/images/{image_id}",
+    response_class=FileResponse,
+    summary="Изображение, извлеченное из документа",
+    description="Изображения перечислены в поле images ответа /ocr/json (include_images=true)"
+)
+async def image_endpoint(image_id: str, request: Request):
+    """
+    Отдача изображения из хранилища по хэшу содержимого
+    """
+    if not IMAGE_ID_RE.fullmatch(image_id):
+        raise HTTPException(status_code=404, detail="Изображение не найдено")
     
-    finally:
-        shutil.rmtree(tmp_dir, ignore_errors=True)
+    # Содержимое определяется хэшем и никогда не меняется
+    etag = f'"{image_id}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    path = processor.image_path(image_id)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Изображение не найдено")
+    
+    return FileResponse(path, headers=headers)
 
 
-@app.get("/", response_class=PlainTextResponse)
-async def root():
-    """Информация об API"""
-    return f"""
+# Страница с информацией об API (зависит только от настроек)
+ROOT_PAGE = f"""
 ╔════════════════════════════════════════════════════════════╗
 ║              CHANDRA OCR API SERVICE v1.0                  ║
 ╚════════════════════════════════════════════════════════════╝
@@ -401,6 +1224,8 @@ async def root():
 📋 Endpoints:
   POST /ocr      - Распознать документ → текст (Markdown)
   POST /ocr/json - Распознать документ → JSON с метаданными
+  POST /ocr/raw  - Распознать документ из тела запроса (без multipart)
+  GET  /images/{{id}} - Изображение, извлеченное из документа
   GET  /health   - Проверка здоровья сервиса
   GET  /docs     - Swagger документация
   GET  /redoc    - ReDoc документация
@@ -425,25 +1250,21 @@ async def root():
 """
 
 
+@app.get("/", response_class=PlainTextResponse)
+async def root():
+    """Информация об API"""
+    return ROOT_PAGE
+
+
 @app.get("/health")
 async def health_check():
     """Проверка работоспособности сервиса"""
-    try:
-        # Проверка доступности команды chandra
-        result = subprocess.run(
-            ["chandra", "--help"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=5
-        )
-        chandra_available = result.returncode == 0
-    except Exception as e:
-        chandra_available = False
-        logger.error(f"Chandra недоступна: {e}")
+    chandra_available = app.state.chandra_available
     
     return {
         "status": "healthy" if chandra_available else "unhealthy",
         "chandra_available": chandra_available,
+        "chandra_checked_at": app.state.chandra_checked_at,
         "version": "1.0.0",
         "temp_dir": str(settings.TEMP_DIR),
         "temp_dir_exists": settings.TEMP_DIR.exists()
@@ -452,14 +1273,16 @@ async def health_check():
 
 if __name__ == "__main__":
     # Создание необходимых директорий
-    settings.TEMP_DIR.mkdir(parents=True, exist_ok=True)
-    settings.LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+    settings.CACHE_DIR.mkdir(parents=True, exist_ok=True)
     
-    logger.info(f"Запуск Chandra OCR API на порту {settings.PORT}")
+    logger.info("Запуск Chandra OCR API на порту %s", settings.PORT)
     
+    # Несколько воркеров импортируют приложение по строке; в одном
+    # процессе передается уже созданный app без повторного импорта модуля
     uvicorn.run(
-        app,
+        "main:app" if settings.WEB_CONCURRENCY > 1 else app,
         host=settings.HOST,
         port=settings.PORT,
+        workers=settings.WEB_CONCURRENCY,
         log_level=settings.LOG_LEVEL.lower()
     )